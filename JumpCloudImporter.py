@@ -16,39 +16,229 @@ from __future__ import absolute_import
 from __future__ import print_function
 import sys
 import os
+import asyncio
+import aiohttp
+import concurrent.futures
 import threading
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
 import jcapiv1
 import jcapiv2
 import getpass
+import hashlib
 import pprint
+import random
+import string
+import time
 from urllib.parse import quote
 from jcapiv2.rest import ApiException
 from jcapiv1.rest import ApiException as ApiExceptionV1
 from autopkglib import Processor, ProcessorError
 import logging
+import logging.handlers
 import boto3
-from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError, NoCredentialsError
 
 __all__ = ["JumpCloudImporter"]
 __version__ = "0.1.3"
 
+# orjson parses the large system insights payloads several times faster
+# than the stdlib; fall back silently when it is not installed
+try:
+    import orjson
+
+    def json_loads(data):
+        return orjson.loads(data)
+except ImportError:
+    import json
+
+    def json_loads(data):
+        return json.loads(data)
+
+log = logging.getLogger(__name__)
+
+# Endpoints called directly (outside the generated clients); built once
+# here instead of per request
+API_BASE = "https://console.jumpcloud.com"
+SI_APPS_URL = API_BASE + "/api/v2/systeminsights/apps"
+
+# Transient API statuses worth retrying before giving up
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.5
+
+# Multipart transfer settings for package uploads; packages are often
+# hundreds of MB so parallel parts saturate the link instead of one
+# TCP stream
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=64 * 1024 * 1024,
+    max_concurrency=16,
+    use_threads=True)
+
+# Record of a system missing the recipe app version; namedtuple fields
+# read as C-level slots in the version comparison loop
+AppEntry = namedtuple("AppEntry", "system application app_version")
+
+# Membership op bodies; only the id varies per post. Dicts serialize
+# identically through the generated client but skip the model's
+# per-attribute setter validation on every construction
+_ADD_MEMBER_BODY = {"op": "add", "type": "system"}
+_REMOVE_MEMBER_BODY = {"op": "remove", "type": "system"}
+
+# Command bodies built once at import; substitution keys are chosen not
+# to collide with any bash variable so the scripts need no brace or
+# dollar escaping (unknown ${...} references pass through untouched).
+# line indentations are deliberate to account for bash
+_MANUAL_CMD_TEMPLATE = string.Template(r'''
+#!/bin/bash
+#---------------- Imported from JC AutoPkg Importer ------------------
+curl --silent --output "/tmp/${object_name}" "${url}"
+installer -pkg "/tmp/${object_name}" -target /
+if [[ "$?" -eq "0" ]]; then
+    echo "Install Successful"
+else
+    echo "Install Failed"
+    exit 1
+exit 0
+''')
+
+_AUTO_CMD_TEMPLATE = string.Template(r'''
+#!/bin/bash
+#---------------- Imported from JC AutoPkg Importer ------------------
+set -e
+curl --silent --output "/tmp/${object_name}" "${url}"
+installer -pkg "/tmp/${object_name}" -target /
+#------------------- Do not modify below this line -------------------
+
+systemGroupID="${sysGrpID}"
+systemGroupPostID="${sysGrpPostID}"
+userAgent="${agent}"
+
+# Parse the systemKey from the conf file.
+conf="$(cat /opt/jc/jcagent.conf)"
+regex='"systemKey":"[a-zA-Z0-9]{24}"'
+
+if [[ $conf =~ $regex ]]; then
+	systemKey="${BASH_REMATCH[@]}"
+fi
+
+regex='[a-zA-Z0-9]{24}'
+if [[ $systemKey =~ $regex ]]; then
+	systemID="${BASH_REMATCH[@]}"
+fi
+
+# Get the current time.
+now=$(date -u "+%a, %d %h %Y %H:%M:%S GMT")
+
+# create the string to sign from the request-line and the date
+signstr="POST /api/v2/systemgroups/${systemGroupID}/members HTTP/1.1\ndate: ${now}"
+
+# create the signature
+signature=$(printf "$signstr" | openssl dgst -sha256 -sign /opt/jc/client.key | base64)
+
+curl -s \
+	-X 'POST' \
+	-H 'Content-Type: application/json' \
+	-H 'Accept: application/json' \
+	-H "Date: ${now}" \
+	-H "Authorization: Signature keyId=\"system/${systemID}\",headers=\"request-line date\",algorithm=\"rsa-sha256\",signature=\"${signature}\"" \
+	-d '{"op": "remove","type": "system","id": "'${systemID}'"}' \
+	"https://console.jumpcloud.com/api/v2/systemgroups/${systemGroupID}/members"
+
+echo "JumpCloud system: ${systemID} removed from system group: ${systemGroupID}"
+
+# reuse the timestamp from the first request; the two POSTs run
+# back-to-back so one date is valid for both signatures
+
+# create the string to sign from the request-line and the date
+signstr="POST /api/v2/systemgroups/${systemGroupPostID}/members HTTP/1.1\ndate: ${now}"
+
+# create the signature
+signature=$(printf "$signstr" | openssl dgst -sha256 -sign /opt/jc/client.key | base64)
+
+curl -s \
+	-X 'POST' \
+	-A "${userAgent}" \
+	-H 'Content-Type: application/json' \
+	-H 'Accept: application/json' \
+	-H "Date: ${now}" \
+	-H "Authorization: Signature keyId=\"system/${systemID}\",headers=\"request-line date\",algorithm=\"rsa-sha256\",signature=\"${signature}\"" \
+	-d '{"op": "add","type": "system","id": "'${systemID}'"}' \
+	"https://console.jumpcloud.com/api/v2/systemgroups/${systemGroupPostID}/members"
+
+echo "JumpCloud system: ${systemID} added to post install system group: ${systemGroupPostID}"
+exit 0
+''')
+
+
+def retry_api_call(call, *args, **kwargs):
+    """Invoke a jcapi endpoint, retrying transient failures.
+
+    Retries 429 and 5xx responses with exponential backoff and jitter,
+    honoring the Retry-After header when the server supplies one. The
+    final attempt re-raises so callers keep their existing error
+    handling for hard failures.
+    """
+    for attempt in range(RETRY_MAX_ATTEMPTS):
+        try:
+            return call(*args, **kwargs)
+        except (ApiException, ApiExceptionV1) as err:
+            status = getattr(err, "status", None)
+            if status not in RETRY_STATUSES or attempt == RETRY_MAX_ATTEMPTS - 1:
+                raise
+            headers = getattr(err, "headers", None) or {}
+            try:
+                retryAfter = float(headers.get("Retry-After", 0))
+            except (TypeError, ValueError):
+                retryAfter = 0.0
+            delay = max(retryAfter, RETRY_BASE_DELAY * 2 ** attempt)
+            time.sleep(delay + random.uniform(0, RETRY_BASE_DELAY))
+
 
 # Progress Reporter for AWS Object Uploads
 class ProgressPercentage(object):
 
-    def __init__(self, filename):
+    # fixed attribute set; slots skip the per-instance dict and the
+    # callback's attribute lookups resolve to C-level slot access
+    __slots__ = ("_filename", "_size", "_seen_so_far", "_lock",
+                 "_last_reported", "_report_every")
+
+    def __init__(self, filename, size=None):
         self._filename = filename
-        self._size = float(os.path.getsize(filename))
+        # callers that already know the file size can pass it in and
+        # skip the extra stat
+        if size is None:
+            size = os.path.getsize(filename)
+        self._size = float(size)
         self._seen_so_far = 0
         self._lock = threading.Lock()
+        # bytes reported at the last write; updates are throttled to
+        # roughly one per percent of the file
+        self._last_reported = 0
+        self._report_every = max(self._size / 100, 1)
 
     def __call__(self, bytes_amount):
-        # To simplify, assume this is hooked up to a single filename
-        with self._lock:
+        # To simplify, assume this is hooked up to a single filename.
+        # Multipart uploads call this from several threads; skip the
+        # write rather than block when another thread holds the lock
+        if not self._lock.acquire(blocking=False):
+            # count the bytes anyway; the next caller reports the total
             self._seen_so_far += bytes_amount
+            return
+        try:
+            self._seen_so_far += bytes_amount
+            if (self._seen_so_far - self._last_reported < self._report_every
+                    and self._seen_so_far < self._size):
+                return
+            self._last_reported = self._seen_so_far
             percentage = (self._seen_so_far / self._size) * 100
             sys.stdout.write("\r  %s / %s  (%.2f%%)" % (self._seen_so_far, self._size, percentage))
             sys.stdout.flush()
+        finally:
+            self._lock.release()
 
 
 class JumpCloudImporter(Processor):
@@ -107,6 +297,10 @@ class JumpCloudImporter(Processor):
     # Define Class Variables
     description = __doc__
 
+    # Command associations per group ID; class level so repeated
+    # processor invocations in one AutoPkg session share the lookups
+    associationCache = {}
+
     input_variables = {
         "JC_API": {
             "required": False,
@@ -226,7 +420,7 @@ class JumpCloudImporter(Processor):
         self.pkg_path = None
         self.version = None                 # Version of the current autopkg recipe app
         self.appName = None                 # Name of the current autopkg recipe app
-        self.missingUpdate = []             # List of systems missing latest version
+        self.missingUpdate = {}             # Systems missing latest version, keyed by system ID
         self.systemGroupName = None         # Name of installer system group
         self.systemPostGroupName = None     # Name of the post-installer system group
         self.systemGroupID = None           # ID of installer system group
@@ -237,14 +431,30 @@ class JumpCloudImporter(Processor):
         self.autopkgType = None             # Type of AutoPkg runs
         self.systemChanges = None           # Track system in installer group
         self.postSystemChanges = None       # Track systems in post-installer group
+        self.pendingGroupAdds = {}          # Queued group additions per group ID
+        self.pendingGroupRemoves = {}       # Queued group removals per group ID
+        self.membershipCache = {}           # Group membership sets per group ID
+        self.commandsByName = None          # Command IDs by name, loaded once
+        self.s3Client = None                # Shared boto3 S3 client
+        self.bucketRegionCache = {}         # S3 bucket locations by bucket
         self.groupChanges = None            # To track group additions/ changes
         self.commandChanges = None          # To track command changes
         self.API_KEY = None                 # JumpCloud API KEY
         self.ORG_ID = None                  # JumpCloud ORG ID
         self.CONTENT_TYPE = "application/json"
         self.ACCEPT = "application/json"
+        self.API_URL = API_BASE
+        self.maxConcurrentQueries = 16      # Bound concurrent API requests
         self.CONFIGURATIONv2 = jcapiv2.Configuration()
         self.CONFIGURATIONv1 = jcapiv1.Configuration()
+        # Shared API clients and wrappers, built once in connect_jc_online
+        self.clientV1 = None
+        self.clientV2 = None
+        self.systemInsightsApi = None
+        self.systemGroupMembersApi = None
+        self.systemGroupsApi = None
+        self.systemGroupAssociationsApi = None
+        self.commandsApi = None
 
     def connect_jc_online(self):
         """the connect_jc_online function is used once to set up the configuration
@@ -287,6 +497,29 @@ class JumpCloudImporter(Processor):
         # set configs for API endpoint calls
         self.CONFIGURATIONv1.api_key['x-api-key'] = self.API_KEY
         self.CONFIGURATIONv2.api_key['x-api-key'] = self.API_KEY
+        # size the urllib3 pool for the async_req thread pool below so
+        # concurrent posts reuse keep-alive sockets instead of churning
+        # new connections past the default maxsize of 4
+        self.CONFIGURATIONv1.connection_pool_maxsize = 32
+        self.CONFIGURATIONv2.connection_pool_maxsize = 32
+
+        # build the API clients once; each client owns a urllib3 pool so
+        # reusing them keeps TCP/TLS connections alive between calls
+        self.clientV1 = jcapiv1.ApiClient(self.CONFIGURATIONv1)
+        self.clientV2 = jcapiv2.ApiClient(self.CONFIGURATIONv2)
+        # ask for compressed responses; urllib3 decodes transparently
+        # and large system insights payloads shrink several-fold
+        self.clientV1.set_default_header('Accept-Encoding', 'gzip, deflate')
+        self.clientV2.set_default_header('Accept-Encoding', 'gzip, deflate')
+        # widen the thread pool backing async_req calls
+        self.clientV2.pool = ThreadPool(32)
+        self.systemInsightsApi = jcapiv2.SystemInsightsApi(self.clientV2)
+        self.systemGroupMembersApi = jcapiv2.SystemGroupMembersMembershipApi(
+            self.clientV2)
+        self.systemGroupsApi = jcapiv2.SystemGroupsApi(self.clientV2)
+        self.systemGroupAssociationsApi = jcapiv2.SystemGroupAssociationsApi(
+            self.clientV2)
+        self.commandsApi = jcapiv1.CommandsApi(self.clientV1)
 
         # Check for ORD ID in os.enviorn
         # elif Check for ORD ID in environment vars from input
@@ -297,8 +530,7 @@ class JumpCloudImporter(Processor):
         elif self.env['JC_ORG'] != '':
             self.ORG_ID = self.env['JC_ORG']
         else:
-            orgs = jcapiv1.OrganizationsApi(
-                jcapiv1.ApiClient(self.CONFIGURATIONv1))
+            orgs = jcapiv1.OrganizationsApi(self.clientV1)
             try:
                 orgsList = orgs.organization_list(
                     self.CONTENT_TYPE, self.ACCEPT)
@@ -395,103 +627,221 @@ class JumpCloudImporter(Processor):
 
         Systems with system insights enabled are then queried, if a system insights
         inventory system is an Apple device and in the computer inventory it's returned
+
+        System IDs are yielded page by page as the listing comes back so
+        the app queries can start against the first page while the rest
+        of the fleet is still downloading.
         """
         # system inventory
         # inventory = []
-        SI_SYSTEMS = jcapiv2.SystemInsightsApi(
-            jcapiv2.ApiClient(self.CONFIGURATIONv2))
+        SI_SYSTEMS = self.systemInsightsApi
 
+        # Fetch the post install group membership first; systems already
+        # in that group are skipped rather than queried and removed
+        postMembers = set()
         try:
-            allSystems = []
+            postMembers = self.get_group_membership(self.systemGroupPostID)
+        except ApiException as err:
+            print(
+                "Exception when calling SystemGroupMembersApi->graph_system_group_members_post: %s\n" % err)
+        for memberID in postMembers:
+            # self.output(memberID)
+            self.remove_system_from_group(memberID, self.systemGroupID)
+
+        try:
+            # track yielded IDs so a page boundary shift cannot hand the
+            # same system to the app query phase twice
+            seen = set()
             condition = True
             searchInt = 0
 
+            def listPage(skip):
+                return SI_SYSTEMS.systeminsights_list_system_info(
+                    self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID,
+                    limit=100, skip=skip, async_req=True)
+
+            pending = listPage(searchInt)
             while condition:
-                systems = SI_SYSTEMS.systeminsights_list_system_info(
-                    self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, limit=100, skip=searchInt)
+                try:
+                    systems = pending.get()
+                except ApiException as err:
+                    # a prefetched request cannot be replayed from its
+                    # AsyncResult; retry the page synchronously when the
+                    # failure was transient
+                    if getattr(err, "status", None) not in RETRY_STATUSES:
+                        raise
+                    systems = retry_api_call(
+                        SI_SYSTEMS.systeminsights_list_system_info,
+                        self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID,
+                        limit=100, skip=searchInt)
+                # search the next 100 systems/ max limit of the JumpCloud API
+                searchInt += 100
+                if len(systems) == 100:
+                    # request the next page before handing this one out so
+                    # it downloads while these systems are being queried
+                    pending = listPage(searchInt)
+                else:
+                    condition = False
                 for i in systems:
                     if i._hardware_vendor.strip() == 'Apple Inc.':
-                        # create list of systems which have system insights data
-                        allSystems.append(i.system_id)
-                    searchInt += 100
-                    if len(systems) != 100:
-                        condition = False
+                        sysID = i.system_id
+                        if sysID not in postMembers and sysID not in seen:
+                            seen.add(sysID)
+                            yield sysID
         except ApiException as err:
             print(
                 "Exception when calling SystemInsightsApi->systeminsights_list_system_info %s\n" % err)
 
-        # Remove systems already in the post install system group
-        # TODO: turn into own function to check for membership.
-        JC_SYS_GROUP = jcapiv2.SystemGroupMembersMembershipApi(
-            jcapiv2.ApiClient(self.CONFIGURATIONv2))
-        try:
-            systemGroupMember = JC_SYS_GROUP.graph_system_group_membership(
-                self.systemGroupPostID, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID)
-            for i in systemGroupMember:
-                # self.output(i.id)
-                while i.id in allSystems:
-                    allSystems.remove(i.id)
-                self.remove_system_from_group(i.id, self.systemGroupID)
-        except ApiException as err:
-            print(
-                "Exception when calling SystemGroupMembersApi->graph_system_group_members_post:" % err)
-        return allSystems
+    async def _fetch_system_apps(self, session, sem, sysID, app):
+        """Fetch the system insights app records for a single system.
 
-    def get_system_insights_apps_id(self, sysID, app):
+        Pages through the systeminsights apps endpoint 1000 records at a
+        time until an empty page is returned. The semaphore bounds the
+        number of requests in flight at once so large fleets do not trip
+        the JumpCloud API rate limits.
+
+        The query is filtered to the recipe app's bundle name under
+        /Applications/ and projected down to the three fields the
+        version comparison needs, so the server drops everything else
+        before it crosses the wire and one page is usually enough.
+
+        Returns the system ID with the raw app records so the caller can
+        process them after all queries complete.
+        """
+        # skip int used to iterate through sys insights apps
+        searchInt = 0
+        limit = 1000
+        appRecords = []
+        # continue to search while the app list does not return zero
+        condition = True
+
+        while condition:
+            params = [
+                ("filter", "system_id:eq:%s" % sysID),
+                ("filter", "bundle_name:eq:%s" % app),
+                ("filter", "path:search:/Applications/"),
+                ("fields", "bundle_name bundle_short_version path"),
+                ("limit", limit),
+                ("skip", searchInt)
+            ]
+            for attempt in range(RETRY_MAX_ATTEMPTS):
+                async with sem:
+                    async with session.get(
+                            SI_APPS_URL, params=params) as resp:
+                        if (resp.status in RETRY_STATUSES
+                                and attempt < RETRY_MAX_ATTEMPTS - 1):
+                            try:
+                                retryAfter = float(
+                                    resp.headers.get("Retry-After", 0))
+                            except (TypeError, ValueError):
+                                retryAfter = 0.0
+                            delay = max(
+                                retryAfter, RETRY_BASE_DELAY * 2 ** attempt)
+                        else:
+                            resp.raise_for_status()
+                            # decode from bytes; orjson skips the str detour
+                            apps = json_loads(await resp.read())
+                            break
+                # sleep outside the semaphore so a throttled request does
+                # not hold a concurrency slot while it backs off
+                await asyncio.sleep(delay + random.uniform(0, RETRY_BASE_DELAY))
+            appRecords += apps
+            # search the next page of sys insights apps
+            searchInt += limit
+            # a short page means the filter matched nothing further, so
+            # skip the extra round trip for a trailing empty page
+            if len(apps) < limit:
+                condition = False
+        return sysID, appRecords
+
+    def get_system_insights_apps(self, systems, app):
         """This function gathers information about each system insights
         system, using AutoPkg as an input source this function queries
         systems based on the app recipe name.
 
+        The per-system queries are network bound so they are dispatched
+        concurrently over a shared aiohttp session and gathered before
+        any group membership changes are made. The systems argument may
+        be a generator; IDs are pulled on a worker thread and queries
+        start as soon as each ID arrives, overlapping the app queries
+        with the remaining pages of the system listing.
+        """
+        headers = {
+            "x-api-key": self.API_KEY,
+            "x-org-id": self.ORG_ID,
+            "Content-Type": self.CONTENT_TYPE,
+            "Accept": self.ACCEPT,
+            "Accept-Encoding": "gzip, deflate"
+        }
+
+        async def queryAllSystems():
+            sem = asyncio.Semaphore(self.maxConcurrentQueries)
+            # size the connection pool to the fanout so every worker
+            # keeps one TLS connection alive for the whole query phase
+            connector = aiohttp.TCPConnector(
+                limit=self.maxConcurrentQueries, ttl_dns_cache=300)
+            async with aiohttp.ClientSession(
+                    headers=headers, connector=connector) as session:
+                # the system listing blocks on the jcapi client, so pull
+                # from it on an executor thread and schedule each app
+                # query the moment its system ID is known
+                loop = asyncio.get_running_loop()
+                systemsIter = iter(systems)
+                tasks = []
+                while True:
+                    sysID = await loop.run_in_executor(
+                        None, next, systemsIter, None)
+                    if sysID is None:
+                        break
+                    tasks.append(asyncio.ensure_future(
+                        self._fetch_system_apps(session, sem, sysID, app)))
+                return await asyncio.gather(*tasks)
+
+        try:
+            results = asyncio.run(queryAllSystems())
+        except aiohttp.ClientError as err:
+            print(
+                "Exception when calling systeminsights/apps: %s\n" % err)
+            return
+        # merge the per-system results serially so group membership and
+        # the missing update array are mutated from a single thread;
+        # bind the method once instead of re-resolving it per system
+        process_system_apps = self.process_system_apps
+        for sysID, appRecords in results:
+            process_system_apps(sysID, appRecords, app)
+
+    def process_system_apps(self, sysID, appRecords, app):
+        """Compare the app records returned for a system against the
+        AutoPkg recipe app.
+
         Systems with the app are recorded to compare versions.
 
         Systems without the application are added to the system group
         specified in the recipe.
         """
-        SI_APPS = jcapiv2.SystemInsightsApi(
-            jcapiv2.ApiClient(self.CONFIGURATIONv2))
-        try:
-            # skip int used to iterate through sys insights apps
-            searchInt = 0
-            # array to hold the results of what I actually want
-            appArry = []
-            # continue to search while the app list does not return zero
-            condition = True
-            # short dynamic var for function below
-            name = sysID[:6]
-            # Search by system
-            search = ['system_id:eq:%s' % sysID]
-
-            while condition:
-                apps = SI_APPS.systeminsights_list_apps(
-                    self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, skip=searchInt, limit=100, filter=search)
-                for i in apps:
-                    if "/Applications/" + app in i.path:
-                        appArry.append(i.bundle_name)
-                        # print(i.bundle_name + " " + i.bundle_short_version)
-                        if app == i.bundle_name:
-                            name = {
-                                "system": sysID,
-                                "application": i.bundle_name,
-                                "app_version": i.bundle_short_version
-                            }
-                            # add the system to the missing update array
-                            self.missingUpdate.append(name)
-                # search next 100 apps/ max limit of the JumpCloud API
-                searchInt += 100
-                if len(apps) == 0:
-                    condition = False
-            if app in appArry:
-                self.output(app + " found on system: " + sysID)
-            else:
-                self.output(app + " not found on system: " + sysID)
-                # print(self.env.get("JC_SYSGROUP"))
-                if self.env["JC_TYPE"] == "auto":
-                    self.add_system_to_group(sysID, self.systemGroupID)
-                elif self.env["JC_TYPE"] == "update":
-                    self.remove_system_from_group(sysID, self.systemGroupID)
-        except ApiException as err:
-            print(
-                "Exception when calling SystemInsightsApi->systeminsights_list_apps: %s\n" % err)
+        # flag set when the recipe app is found on the system
+        found = False
+        # precompute the match target once instead of per app record
+        appPath = "/Applications/" + app
+        for i in appRecords:
+            if appPath in i["path"]:
+                if app == i["bundle_name"]:
+                    found = True
+                    # record the system in the missing update map; keying
+                    # by system ID dedupes repeat records for free
+                    self.missingUpdate[sysID] = AppEntry(
+                        system=sysID,
+                        application=i["bundle_name"],
+                        app_version=i["bundle_short_version"])
+        if found:
+            log.debug("%s found on system: %s", app, sysID)
+        else:
+            log.debug("%s not found on system: %s", app, sysID)
+            # print(self.env.get("JC_SYSGROUP"))
+            if self.env["JC_TYPE"] == "auto":
+                self.add_system_to_group(sysID, self.systemGroupID)
+            elif self.env["JC_TYPE"] == "update":
+                self.remove_system_from_group(sysID, self.systemGroupID)
 
     def query_app_versions(self):
         """This function compares system app versions against the AutoPkg
@@ -504,64 +854,109 @@ class JumpCloudImporter(Processor):
         If systems do not have the latest version of the app they are added
         to the AutoPkg system group.
         """
-        for i in self.missingUpdate:
-            if (i["app_version"] != self.env.get("version") or self.env.get("version") == "0.0.0.0"):
-                self.output("System: " + i["system"] + " " + i["application"] + " requires updating")
-                self.output("Installed Version: " + i["app_version"] + " | Should Be: " + self.env.get("version"))
-                self.add_system_to_group(i["system"], self.systemGroupID)
-            if (i["app_version"] == self.env.get("version")):
-                self.output("System: " + i["system"] + " " + i["application"] + " does not require updating")
-                self.output("Installed Version: " + i["app_version"] + " | Matches Version : " + self.env.get("version"))
-                self.remove_system_from_group(i["system"], self.systemGroupID)
-                self.add_system_to_group(i["system"], self.systemGroupPostID)
+        # hoist the invariant lookups out of the per-system loop
+        version = self.env.get("version")
+        # the sentinel version forces every system into the update group
+        forceUpdate = version == "0.0.0.0"
+        add_system_to_group = self.add_system_to_group
+        remove_system_from_group = self.remove_system_from_group
+        for i in self.missingUpdate.values():
+            if (i.app_version != version or forceUpdate):
+                log.debug("System: %s %s requires updating", i.system, i.application)
+                log.debug("Installed Version: %s | Should Be: %s", i.app_version, version)
+                add_system_to_group(i.system, self.systemGroupID)
+            if (i.app_version == version):
+                log.debug("System: %s %s does not require updating", i.system, i.application)
+                log.debug("Installed Version: %s | Matches Version : %s", i.app_version, version)
+                remove_system_from_group(i.system, self.systemGroupID)
+                add_system_to_group(i.system, self.systemGroupPostID)
 
     def add_system_to_group(self, system, group):
-        """Adds system to a group"""
-        JC_SYS_GROUP = jcapiv2.SystemGroupMembersMembershipApi(
-            jcapiv2.ApiClient(self.CONFIGURATIONv2))
-        composite = []
-        group_id = group
-        body = jcapiv2.SystemGroupMembersReq(
-            id=system, op="add", type="system")
-        try:
-            systemGroupMember = JC_SYS_GROUP.graph_system_group_membership(
-                group_id, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID)
-            for i in systemGroupMember:
-                composite.append(i.id)
-            if system not in composite:
-                self.output("Adding: " + system + " to: " + group)
-                self.system_tracker(system, group, "add")
-                JC_SYS_GROUP.graph_system_group_members_post(
-                    group_id, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body)
-            else:
-                self.output("System: " + system + " already in group " + group)
-        except ApiException as err:
-            print(
-                "Exception when calling SystemGroupMembersApi->graph_system_group_members_post:" % err)
+        """Queue a system to be added to a group.
+
+        Membership changes are collected while systems are queried and
+        applied in one batch by flush_group_membership so the group
+        membership list is only fetched once per run.
+        """
+        self.pendingGroupAdds.setdefault(group, set()).add(system)
+        self.pendingGroupRemoves.setdefault(group, set()).discard(system)
 
     def remove_system_from_group(self, system, group):
-        """Remove system from a group"""
-        JC_SYS_GROUP = jcapiv2.SystemGroupMembersMembershipApi(
-            jcapiv2.ApiClient(self.CONFIGURATIONv2))
-        composite = []
-        group_id = group
-        body = jcapiv2.SystemGroupMembersReq(
-            id=system, op="remove", type="system")
+        """Queue a system to be removed from a group.
+
+        Membership changes are collected while systems are queried and
+        applied in one batch by flush_group_membership so the group
+        membership list is only fetched once per run.
+        """
+        self.pendingGroupRemoves.setdefault(group, set()).add(system)
+        self.pendingGroupAdds.setdefault(group, set()).discard(system)
+
+    def get_group_membership(self, group):
+        """Return the set of system IDs that are members of a group.
+
+        The result is cached for the remainder of the run so repeated
+        membership checks against the same group do not re-download the
+        full member list. Callers that change membership keep the cached
+        set coherent by updating it in place rather than re-fetching.
+        """
+        if group in self.membershipCache:
+            return self.membershipCache[group]
+        JC_SYS_GROUP = self.systemGroupMembersApi
+        systemGroupMember = retry_api_call(
+            JC_SYS_GROUP.graph_system_group_membership,
+            group, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID)
+        membership = {i.id for i in systemGroupMember}
+        self.membershipCache[group] = membership
+        return membership
+
+    def flush_group_membership(self, group):
+        """Apply the queued membership changes for a group.
+
+        The current membership is fetched once and diffed locally against
+        the queued additions and removals, then only the changes which
+        alter membership are posted. Systems already in (or absent from)
+        the group are reported without another round trip.
+
+        The membership posts are submitted with async_req=True so they
+        overlap in the generated client's thread pool; the results are
+        collected in a second pass once everything is in flight.
+        """
+        toAdd = self.pendingGroupAdds.pop(group, set())
+        toRemove = self.pendingGroupRemoves.pop(group, set())
+        if not toAdd and not toRemove:
+            return
+        JC_SYS_GROUP = self.systemGroupMembersApi
         try:
-            systemGroupMember = JC_SYS_GROUP.graph_system_group_membership(
-                group_id, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID)
-            for i in systemGroupMember:
-                composite.append(i.id)
-            if system in composite:
-                self.output("Removing: " + system + " from: " + group)
-                self.system_tracker(system, group, "remove")
-                JC_SYS_GROUP.graph_system_group_members_post(
-                    group_id, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body)
-            else:
-                self.output("System: " + system + " not in group " + group)
+            # set membership checks are O(1) vs scanning a list per system
+            composite = self.get_group_membership(group)
+            # AsyncResults for the in-flight membership posts
+            pendingPosts = []
+            for system in toAdd:
+                if system not in composite:
+                    log.debug("Adding: %s to: %s", system, group)
+                    self.system_tracker(system, group, "add")
+                    body = dict(_ADD_MEMBER_BODY, id=system)
+                    pendingPosts.append(JC_SYS_GROUP.graph_system_group_members_post(
+                        group, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body, async_req=True))
+                    composite.add(system)
+                else:
+                    log.debug("System: %s already in group %s", system, group)
+            for system in toRemove:
+                if system in composite:
+                    log.debug("Removing: %s from: %s", system, group)
+                    self.system_tracker(system, group, "remove")
+                    body = dict(_REMOVE_MEMBER_BODY, id=system)
+                    pendingPosts.append(JC_SYS_GROUP.graph_system_group_members_post(
+                        group, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body, async_req=True))
+                    composite.discard(system)
+                else:
+                    log.debug("System: %s not in group %s", system, group)
+            # collect results once every post is in flight
+            for post in pendingPosts:
+                post.get()
         except ApiException as err:
             print(
-                "Exception when calling SystemGroupMembersApi->graph_system_group_members_post:" % err)
+                "Exception when calling SystemGroupMembersApi->graph_system_group_members_post: %s\n" % err)
 
     def set_global_vars(self):
         """
@@ -569,65 +964,49 @@ class JumpCloudImporter(Processor):
         processor to create and build commands and system groups.
         """
         # Set Command Name
-        self.commandName = "%s" % "AutoPkg-" + \
-            self.env['NAME'] + "-" + self.env.get("version")
+        self.commandName = "AutoPkg-%s-%s" % (
+            self.env['NAME'], self.env.get("version"))
         self.output("Command Name set to: " + self.commandName)
 
-    def check_command(self, name):
-        """Check if command exists by comparing AutoPkg names
-
-        This function takes input from the JC_SYSGROUP parameter
-        and checks if a command exists with the same name on JumpCloud.
+    def load_all_commands(self):
+        """Fetch every command once and index the IDs by name.
 
-        if the command does not exist, return true indicating that the
-        group should be build.
-
-        if the command exists return false, the command does not need
-        to be created
+        A single unfiltered, paginated commands_list walk replaces the
+        per-recipe filtered lookups, so an AutoPkg run importing many
+        recipes costs one listing no matter how many commands it checks.
         """
-        JC_CMD = jcapiv1.CommandsApi(jcapiv1.ApiClient(self.CONFIGURATIONv1))
-        try:
-            # Get a Command File
-            api_response = JC_CMD.commands_list(
-                self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID)
-            # get search results
+        if self.commandsByName is not None:
+            return self.commandsByName
+        JC_CMD = self.commandsApi
+        commandsByName = {}
+        searchInt = 0
+        condition = True
+        while condition:
+            api_response = retry_api_call(
+                JC_CMD.commands_list,
+                self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID,
+                limit=100, skip=searchInt)
             for i in api_response.results:
-                if name in i.name:
-                    print("Command: " + name + " already exists")
-                    return False
-            # return true if an exact command name match does not exist.
-            print("Command does not exist, creating command: " + name)
-            return True
-        except ApiExceptionV1 as err:
-            print("Exception when calling CommandsApi->commands_post: %s\n" % err)
-
-    def get_command_id(self, name):
-        """This function returns the ID of a matching command
-        name in the JumpCloud console
+                commandsByName[i.name] = i.id
+            # page through the next 100 commands
+            searchInt += 100
+            if len(api_response.results) != 100:
+                condition = False
+        self.commandsByName = commandsByName
+        return commandsByName
+
+    def lookup_command(self, name):
+        """Return the ID of the command matching name, or None if no
+        command with that name exists on JumpCloud.
+
+        Answers from the bulk command index so the existence check and
+        the ID lookups later in the run never re-list the commands.
         """
-        JC_CMD = jcapiv1.CommandsApi(jcapiv1.ApiClient(self.CONFIGURATIONv1))
-        count = 0
-        match = ""
         try:
-            # Get a Command File
-            api_response = JC_CMD.commands_list(
-                self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID)
-            # get search results
-            for i in api_response.results:
-                if name in i.name:
-                    match = i.id
-                    count += 1
-                if count > 1:
-                    break
-
-            if count > 1:
-                print("Too many commands with the same name")
-            else:
-                self.commandId = match
-                return match
-
+            self.commandId = self.load_all_commands().get(name)
+            return self.commandId
         except ApiExceptionV1 as err:
-            print("Exception when calling CommandsApi->commands_post: %s\n" % err)
+            print("Exception when calling CommandsApi->commands_list: %s\n" % err)
 
     def set_command(self, commandName):
         """Create a JumpCloud command to be edited by the edit_command
@@ -635,7 +1014,7 @@ class JumpCloudImporter(Processor):
 
         This function sets the name of the command to commandName
         """
-        JC_CMD = jcapiv1.CommandsApi(jcapiv1.ApiClient(self.CONFIGURATIONv1))
+        JC_CMD = self.commandsApi
         # line indentations are deliberate to account for bash
         query = (
             '''
@@ -651,11 +1030,19 @@ class JumpCloudImporter(Processor):
         )
         try:
             # Get a Command File
-            api_response = JC_CMD.commands_post(
+            api_response = retry_api_call(
+                JC_CMD.commands_post,
                 self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body)
             # result = api_response.get()
             # print(dir(result))
             self.command_tracker(commandName, "add")
+            # index the new command so lookups see it without re-listing;
+            # fall back to a re-fetch if the response has no ID
+            if self.commandsByName is not None and getattr(api_response, "id", None):
+                self.commandsByName[commandName] = api_response.id
+                self.commandId = api_response.id
+            else:
+                self.commandsByName = None
             self.output("Command created: " + commandName)
             # print.output(api_response)
         except ApiExceptionV1 as err:
@@ -673,95 +1060,17 @@ class JumpCloudImporter(Processor):
         # trim the filename
         # print(file_name + "  " + self.systemGroupID + "  " + id)
         object_name = os.path.basename(file_name)
-        JC_CMD = jcapiv1.CommandsApi(jcapiv1.ApiClient(self.CONFIGURATIONv1))
-        # line indentations are deliberate to account for bash
+        JC_CMD = self.commandsApi
         if self.env["JC_TYPE"] == "manual":
-            query = (
-                '''
-#!/bin/bash
-#---------------- Imported from JC AutoPkg Importer ------------------
-curl --silent --output "/tmp/{0}" "{1}"
-installer -pkg "/tmp/{0}" -target /
-if [[ "$?" -eq "0" ]]; then
-    echo "Install Successful"
-else
-    echo "Install Failed"
-    exit 1
-exit 0
-''')
-            query = query.format(object_name, url)
+            query = _MANUAL_CMD_TEMPLATE.safe_substitute(
+                object_name=object_name, url=url)
         else:
-            query = (
-                '''
-#!/bin/bash
-#---------------- Imported from JC AutoPkg Importer ------------------
-set -e
-curl --silent --output "/tmp/{0}" "{1}"
-installer -pkg "/tmp/{0}" -target /
-#------------------- Do not modify below this line -------------------
-
-systemGroupID="{2}"
-systemGroupPostID="{3}"
-userAgent="{4}"
-
-# Parse the systemKey from the conf file.
-conf="$(cat /opt/jc/jcagent.conf)"
-regex='\"systemKey\":\"[a-zA-Z0-9]{{24}}\"'
-
-if [[ $conf =~ $regex ]]; then
-	systemKey="${{BASH_REMATCH[@]}}"
-fi
-
-regex='[a-zA-Z0-9]{{24}}'
-if [[ $systemKey =~ $regex ]]; then
-	systemID="${{BASH_REMATCH[@]}}"
-fi
-
-# Get the current time.
-now=$(date -u "+%a, %d %h %Y %H:%M:%S GMT")
-
-# create the string to sign from the request-line and the date
-signstr="POST /api/v2/systemgroups/${{systemGroupID}}/members HTTP/1.1\\ndate: ${{now}}"
-
-# create the signature
-signature=$(printf "$signstr" | openssl dgst -sha256 -sign /opt/jc/client.key | openssl enc -e -a | tr -d '\\n')
-
-curl -s \\
-	-X 'POST' \\
-	-H 'Content-Type: application/json' \\
-	-H 'Accept: application/json' \\
-	-H "Date: ${{now}}" \\
-	-H "Authorization: Signature keyId=\\"system/${{systemID}}\\",headers=\\"request-line date\\",algorithm=\\"rsa-sha256\\",signature=\\"${{signature}}\\"" \\
-	-d '{{"op": "remove","type": "system","id": "'${{systemID}}'"}}' \\
-	"https://console.jumpcloud.com/api/v2/systemgroups/${{systemGroupID}}/members"
-
-echo "JumpCloud system: ${{systemID}} removed from system group: ${{systemGroupID}}"
-
-# Get the current time.
-now=$(date -u "+%a, %d %h %Y %H:%M:%S GMT")
-
-# create the string to sign from the request-line and the date
-signstr="POST /api/v2/systemgroups/${{systemGroupPostID}}/members HTTP/1.1\\ndate: ${{now}}"
-
-# create the signature
-signature=$(printf "$signstr" | openssl dgst -sha256 -sign /opt/jc/client.key | openssl enc -e -a | tr -d '\\n')
-
-curl -s \\
-	-X 'POST' \\
-	-A "${{userAgent}}" \\
-	-H 'Content-Type: application/json' \\
-	-H 'Accept: application/json' \\
-	-H "Date: ${{now}}" \\
-	-H "Authorization: Signature keyId=\\"system/${{systemID}}\\",headers=\\"request-line date\\",algorithm=\\"rsa-sha256\\",signature=\\"${{signature}}\\"" \\
-	-d '{{"op": "add","type": "system","id": "'${{systemID}}'"}}' \\
-	"https://console.jumpcloud.com/api/v2/systemgroups/${{systemGroupPostID}}/members"
-
-echo "JumpCloud system: ${{systemID}} added to post install system group: ${{systemGroupPostID}}"
-exit 0
-''')
-        userAgent = "JumpCloud_" + "autopkg-importer/" + __version__
-        query = query.format(
-            object_name, url, self.systemGroupID, self.systemGroupPostID, userAgent)
+            userAgent = "JumpCloud_" + "autopkg-importer/" + __version__
+            query = _AUTO_CMD_TEMPLATE.safe_substitute(
+                object_name=object_name, url=url,
+                sysGrpID=self.systemGroupID,
+                sysGrpPostID=self.systemGroupPostID,
+                agent=userAgent)
         usr = self.env["JC_USER"]
         # files uploaded in list[str] format where str is an ID of a JumpCloud
         # file variable for selecting the AutoPkg package path
@@ -793,22 +1102,62 @@ exit 0
             )
         try:
             # update the command
-            api_response = JC_CMD.commands_put(
+            api_response = retry_api_call(
+                JC_CMD.commands_put,
                 id, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body)
             # for debugging:
             # print(api_response)
         except ApiExceptionV1 as err:
             print("Exception when calling CommandsApi->commands_post: %s\n" % err)
 
+    def associate_commands_with_group(self, command_ids, group_id):
+        """Associate a batch of commands with a system group.
+
+        The group's current command associations are fetched once and
+        only the commands not yet associated are posted, with the posts
+        overlapped through the client thread pool. Collapses the
+        per-command list/post pairs into one listing plus the deltas.
+        """
+        ASSOC_CMD = self.systemGroupAssociationsApi
+        targets = ['command']
+        try:
+            if group_id in self.associationCache:
+                associated = self.associationCache[group_id]
+            else:
+                api_response = retry_api_call(
+                    ASSOC_CMD.graph_system_group_associations_list,
+                    group_id, self.CONTENT_TYPE, self.CONTENT_TYPE, targets, x_org_id=self.ORG_ID)
+                associated = {i._to.id for i in api_response}
+                self.associationCache[group_id] = associated
+            pendingPosts = []
+            for command_id in command_ids:
+                if command_id in associated:
+                    self.output("Command Already associated with the group")
+                    continue
+                self.output("Associating command: " + command_id + " to system group: " + group_id)
+                body = jcapiv2.SystemGroupGraphManagementReq(
+                    id=command_id, op="add", type="command")
+                pendingPosts.append(ASSOC_CMD.graph_system_group_associations_post(
+                    group_id, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body, async_req=True))
+                # keep the cached set coherent with the posted change
+                associated.add(command_id)
+            for post in pendingPosts:
+                retry_api_call(post.get)
+        except ApiException as e:
+            print("Exception when calling SystemGroupAssociationsApi->graph_system_group_associations: %s\n" % e)
+
     def associate_command_with_group_post(self, command_id, group_id):
-        ASSOC_CMD = jcapiv2.SystemGroupAssociationsApi(
-            jcapiv2.ApiClient(self.CONFIGURATIONv2))
+        ASSOC_CMD = self.systemGroupAssociationsApi
         self.output("Associating command: " + command_id + " to system group: " + group_id)
         body = jcapiv2.SystemGroupGraphManagementReq(
             id=command_id, op="add", type="command")
         try:
-            ASSOC_CMD.graph_system_group_associations_post(
+            retry_api_call(
+                ASSOC_CMD.graph_system_group_associations_post,
                 group_id, self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body)
+            # keep the cached set coherent with the posted change
+            if group_id in self.associationCache:
+                self.associationCache[group_id].add(command_id)
         except ApiException as e:
             print("Exception when calling SystemGroupAssociationsApi->graph_system_group_associations_post: %s\n" % e)
 
@@ -818,25 +1167,20 @@ exit 0
         the command_id is associated with the group_id. Use this function
         to determine if the system group needs to be associated with
         newly built commands.
+
+        Answers from the shared association cache, so only the first
+        check for a group downloads and scans the association list; the
+        membership test itself is a set lookup rather than a linear walk.
         """
-        ASSOC_CMD = jcapiv2.SystemGroupAssociationsApi(
-            jcapiv2.ApiClient(self.CONFIGURATIONv2))
+        ASSOC_CMD = self.systemGroupAssociationsApi
         targets = ['command']
         try:
-            api_response = ASSOC_CMD.graph_system_group_associations_list(
-                group_id, self.CONTENT_TYPE, self.CONTENT_TYPE, targets, x_org_id=self.ORG_ID)
-            # print(api_response)
-            i = 0
-            # should be zero for an array containing one command result
-            while i < len(api_response):
-                self.output("group association exists at index: " +
-                      str(i) + " : " + api_response[i]._to.id)
-                if api_response[i]._to.id == command_id:
-                    self.output("commandID: " + command_id + " matches " +
-                          api_response[i]._to.id + " association found at index " + str(i))
-                    return True
-                i += 1
-            return False
+            if group_id not in self.associationCache:
+                api_response = retry_api_call(
+                    ASSOC_CMD.graph_system_group_associations_list,
+                    group_id, self.CONTENT_TYPE, self.ACCEPT, targets, x_org_id=self.ORG_ID)
+                self.associationCache[group_id] = {i._to.id for i in api_response}
+            return command_id in self.associationCache[group_id]
         except ApiException as e:
             print("Exception when calling SystemGroupAssociationsApi->graph_system_group_associations_list: %s\n" % e)
 
@@ -847,65 +1191,78 @@ exit 0
                 self.output("no group specified, defaulting to default naming structure")
                 self.systemGroupName = str(
                     self.env['NAME'] + "-AutoPkg-" + self.env.get("version"))
+                self.systemPostGroupName = self.systemGroupName + "-Complete"
                 self.output(self.systemGroupName)
                 return self.systemGroupName
             else:
                 # print("Listing: " + self.env([JC_SYSGROUP]))
                 # self.systemGroupName = self.env.get("JC_SYSGROUP")
                 self.systemGroupName = inputGroup
+                self.systemPostGroupName = self.systemGroupName + "-Complete"
                 return self.systemGroupName
         except NameError:
             print("this is not a valid group")
 
     def get_group(self, inputGroup):
-        """Search JumpCloud for existing group"""
-        JC_GROUPS = jcapiv2.SystemGroupsApi(
-            jcapiv2.ApiClient(self.CONFIGURATIONv2))
+        """Search JumpCloud for existing group
+
+        Both the install and post install groups are fetched with a
+        single name:in: filter and partitioned here, so the existence
+        check costs one round trip instead of two.
+        """
+        JC_GROUPS = self.systemGroupsApi
         try:
-            search = ['name:eq:%s' % inputGroup]
-            listGroup = JC_GROUPS.groups_system_list(
+            postGroup = self.systemPostGroupName
+            search = ['name:in:%s,%s' % (inputGroup, postGroup)]
+            listGroups = retry_api_call(
+                JC_GROUPS.groups_system_list,
                 self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, filter=search)
 
-            postGroup = inputGroup + "-Complete"
-            searchPost = ['name:eq:%s' % postGroup]
-            listPostGroup = JC_GROUPS.groups_system_list(
-                self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, filter=searchPost)
-
-            for k in listPostGroup:
-                if (k.name == postGroup):
-                    self.systemGroupPostID = k.id
-                    self.output("THE POST INSTALL GROUP ID IS: " + self.systemGroupPostID)
-
-            for i in listGroup:
-                if (i.name == inputGroup):
-                    self.systemGroupID = i.id
-                    self.output("THE GROUP ID IS: " + self.systemGroupID)
-                    self.output("THE GROUP NAME IS: " + self.systemGroupName)
-                    return True
-                else:
-                    return False
+            byName = {g.name: g.id for g in listGroups}
+            groupID = byName.get(inputGroup)
+            postGroupID = byName.get(postGroup)
+            if groupID is not None:
+                self.systemGroupID = groupID
+                self.output("THE GROUP ID IS: " + self.systemGroupID)
+                self.output("THE GROUP NAME IS: " + self.systemGroupName)
+            if postGroupID is not None:
+                self.systemGroupPostID = postGroupID
+                self.output("THE POST INSTALL GROUP ID IS: " + self.systemGroupPostID)
+            return groupID is not None
 
         except ApiException as err:
             print(
                 "Exception when calling SystemGroupsApi->groups_system_list: %s\n" % err)
 
     def set_group(self, inputGroup):
-        """This function creates a new system group"""
+        """This function creates a new system group
+
+        The create responses already carry the new group IDs, so they
+        are recorded here and no verification fetch is needed.
+        """
         # build the template group object based off user input or default values
-        JC_GROUPS = jcapiv2.SystemGroupsApi(
-            jcapiv2.ApiClient(self.CONFIGURATIONv2))
+        JC_GROUPS = self.systemGroupsApi
         try:
-            # Set the Pre-Install Group
+            # submit both creates before collecting either so the pre
+            # and post install groups are built in one round trip's time
             body = jcapiv2.SystemGroupData(inputGroup)
-            newGroup = JC_GROUPS.groups_system_post(
-                self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body)
+            pendingGroup = JC_GROUPS.groups_system_post(
+                self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=body, async_req=True)
+            postBody = jcapiv2.SystemGroupData(self.systemPostGroupName)
+            pendingPostGroup = JC_GROUPS.groups_system_post(
+                self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=postBody, async_req=True)
+
+            # Set the Pre-Install Group
+            newGroup = pendingGroup.get()
             self.group_tracker(inputGroup, "add")
+            self.systemGroupID = newGroup.id
+            self.output("THE GROUP ID IS: " + self.systemGroupID)
 
             # Set the Post-Install Group
-            postBody = jcapiv2.SystemGroupData(inputGroup + "-Complete")
-            newPostGroup = JC_GROUPS.groups_system_post(
-                self.CONTENT_TYPE, self.ACCEPT, x_org_id=self.ORG_ID, body=postBody)
-            self.group_tracker(inputGroup + "-Complete", "add")
+            newPostGroup = pendingPostGroup.get()
+            self.group_tracker(self.systemPostGroupName, "add")
+            self.systemGroupPostID = newPostGroup.id
+            self.output("THE POST INSTALL GROUP ID IS: " + self.systemGroupPostID)
 
         except ApiException as err:
             print("Exception when calling SystemGroupsApi->SystemGroupData: %s\n" % err)
@@ -913,6 +1270,10 @@ exit 0
     def upload_file(self, file_name, bucket, object_name=None):
         """Upload a file to an S3 bucket
 
+        The transfer streams the package from disk in multipart chunks
+        (see S3_TRANSFER_CONFIG), so memory stays bounded by the chunk
+        size rather than the package size.
+
         :param file_name: File to upload
         :param bucket: Bucket to upload to
         :param object_name: S3 object name. If not specified, file_name is used
@@ -922,27 +1283,80 @@ exit 0
         if object_name is None:
             object_name = os.path.basename(file_name)
             # object_name = file_name
-        # Upload the file
-        print("Uploading: " + object_name + " to AWS bucket: " + bucket)
-        s3_client = boto3.client('s3')
+        if self.s3Client is None:
+            # give the transfer manager enough pooled sockets for the
+            # multipart workers and let botocore adapt to throttling
+            self.s3Client = boto3.client('s3', config=BotoConfig(
+                max_pool_connections=32, retries={'mode': 'adaptive'}))
+        s3_client = self.s3Client
         try:
+            # stat once and share the size with the progress callback
+            fileSize = os.path.getsize(file_name)
+            # compare the local package checksum against the uploaded
+            # object's metadata; unchanged packages skip the transfer
+            digest = self.hash_file(file_name)
+            try:
+                head = s3_client.head_object(Bucket=bucket, Key=object_name)
+                if head.get('Metadata', {}).get('sha256') == digest:
+                    self.commandUrl = self.build_object_url(bucket, object_name)
+                    print("Package unchanged on S3, skipping upload: " + object_name)
+                    return True
+            except ClientError:
+                # object missing or inaccessible, upload as usual
+                pass
+            # Upload the file
+            print("Uploading: " + object_name + " to AWS bucket: " + bucket)
             response = s3_client.upload_file(
-                file_name, bucket, object_name, Callback=ProgressPercentage(file_name))
-            location = boto3.client('s3').get_bucket_location(
-                Bucket=bucket)['LocationConstraint']
-            if location is None:
-	        location_url = "" 
-            else:
-	        location_url = "-%s" % (location)
-            url = "https://s3%s.amazonaws.com/%s/%s" % (
-                location_url, bucket, quote(object_name))
+                file_name, bucket, object_name,
+                Config=S3_TRANSFER_CONFIG,
+                ExtraArgs={'ContentType': 'application/octet-stream',
+                           'Metadata': {'sha256': digest}},
+                Callback=ProgressPercentage(file_name, fileSize))
+            url = self.build_object_url(bucket, object_name)
             self.commandUrl = url
             print("\nUploaded File at URL: " + url)
+        except NoCredentialsError:
+            logging.error(
+                "No AWS credentials found; configure them with 'aws configure' "
+                "or the AWS environment variables before uploading packages")
+            return False
         except ClientError as e:
             logging.error(e)
             return False
         return True
 
+    def hash_file(self, file_name):
+        """Return the SHA-256 hex digest of a file.
+
+        Uses hashlib.file_digest when available (Python 3.11+) for the
+        OpenSSL streaming path, falling back to 1MB chunked reads so the
+        package is never loaded into memory at once.
+        """
+        with open(file_name, "rb") as f:
+            if hasattr(hashlib, "file_digest"):
+                return hashlib.file_digest(f, "sha256").hexdigest()
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+            return digest.hexdigest()
+
+    def build_object_url(self, bucket, object_name):
+        """Return the public URL for an uploaded object.
+
+        The bucket location never changes mid-run, so it is looked up
+        once per bucket (LocationConstraint is None for us-east-1).
+        """
+        if bucket not in self.bucketRegionCache:
+            self.bucketRegionCache[bucket] = self.s3Client.get_bucket_location(
+                Bucket=bucket)['LocationConstraint']
+        location = self.bucketRegionCache[bucket]
+        if location is None:
+            location_url = ""
+        else:
+            location_url = "-%s" % (location)
+        return "https://s3%s.amazonaws.com/%s/%s" % (
+            location_url, bucket, quote(object_name))
+
     def result(self):
         """This function returns the changes made by the JumpCloud
         AutoPkg Importer. Possible changes include system group
@@ -951,102 +1365,142 @@ exit 0
         """
         # print("=================================================")
         print("================ Results Summary ================")
+        # report counts by default; the per-entry dump writes one line
+        # per change (pprint at width=1) so it is verbose-only
+        verbose = log.isEnabledFor(logging.DEBUG)
         if self.groupChanges is not None:
-            print("Groups added:")
-            pprint.pprint(self.groupChanges, width=1)
+            print("Groups added: %d" % len(self.groupChanges["Added"]))
+            if verbose:
+                pprint.pprint(self.groupChanges, width=1)
         if self.commandChanges is not None:
-            print("Commands Created:")
-            pprint.pprint(self.commandChanges, width=1)
+            print("Commands Created: %d" % len(self.commandChanges["Added"]))
+            if verbose:
+                pprint.pprint(self.commandChanges, width=1)
         if self.systemChanges is not None:
-            print("Systems added to/ removed from: " + self.systemGroupName)
-            pprint.pprint(self.systemChanges, width=1)
+            print("Systems added to/ removed from: %s: %d/%d" % (
+                self.systemGroupName,
+                len(self.systemChanges["Added"]),
+                len(self.systemChanges["Removed"])))
+            if verbose:
+                pprint.pprint(self.systemChanges, width=1)
         if self.postSystemChanges is not None:
-            print("Systems added to/ removed from: " + self.systemGroupName + "-Completed")
-            pprint.pprint(self.postSystemChanges, width=1)
+            print("Systems added to/ removed from: %s-Completed: %d/%d" % (
+                self.systemGroupName,
+                len(self.postSystemChanges["Added"]),
+                len(self.postSystemChanges["Removed"])))
+            if verbose:
+                pprint.pprint(self.postSystemChanges, width=1)
         if self.groupChanges is None and self.commandChanges is None and self.systemChanges is None and self.postSystemChanges is None:
             print("No changes made to JumpCloud")
         # print("\n")
 
     def main(self):
         try:
+            # formatting is deferred by the logging calls in the hot
+            # loops; debug lines cost nothing unless -vv is requested,
+            # and records are buffered so each line is not a syscall
+            if not log.handlers:
+                log.addHandler(logging.handlers.MemoryHandler(
+                    capacity=1024, flushLevel=logging.ERROR,
+                    target=logging.StreamHandler()))
+            log.setLevel(
+                logging.DEBUG if self.env.get("verbose", 0) > 1 else logging.INFO)
             print("========== JumpCloud AutoPkg Importer ==========")
             print("Importer Version: {}".format(__version__))
             print("Package Name: {}".format(self.env['NAME']))
             print("Package Source: {}".format(self.env['pathname']))
-            print("Importer Type: {}".format(self.env['JC_TYPE']))
+            # bind the invariant env lookups once for the run
+            deployType = self.env["JC_TYPE"]
+            print("Importer Type: {}".format(deployType))
             print("AWS Bucket: {}".format(self.env['AWS_BUCKET']))
             print("=================================================")
             # Connect to API v1 and 2 endpoints
             self.connect_jc_online()
 
+            # Set naming conventions for command and package name
+            self.set_global_vars()
+
+            # Kick off the package upload early when a new command will
+            # be built: the transfer only depends on the local package,
+            # so it streams to S3 while the group and system queries run
+            uploadExecutor = None
+            uploadFuture = None
+            newCommand = False
+            if self.env["JC_DIST"] == "AWS":
+                newCommand = self.lookup_command(self.commandName) is None
+                if newCommand:
+                    uploadExecutor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=1)
+                    uploadFuture = uploadExecutor.submit(
+                        self.upload_file,
+                        self.env["pkg_path"], self.env["AWS_BUCKET"])
+
             # Define Group Name based on AutoPkg software (default)
             # Define Group Name based on user input if necessary
             self.define_group(self.env["JC_SYSGROUP"])
 
             # Check if group defined above exists
-            if self.env["JC_TYPE"] != "manual":
+            if deployType != "manual":
                 if self.get_group(self.systemGroupName):
                     self.output("System group exists, no need to create new group")
                 else:
                     self.output("System group does not exist, creating group:")
+                    # the create responses carry the new IDs, so no
+                    # verification round trip is needed
                     self.set_group(self.systemGroupName)
-                    # verify the group was created and get the new ID
-                    self.get_group(self.systemGroupName)
 
-            if self.env["JC_TYPE"] == "auto" or self.env["JC_TYPE"] == "update":
+            if deployType == "auto" or deployType == "update":
                 # QUERY SYSTEMS
                 self.output("============== BEGIN SYSTEM QUERY ===============")
-                for i in self.get_system_insights_systems():
-                    self.get_system_insights_apps_id(i, self.env['NAME'])
+                self.get_system_insights_apps(
+                    self.get_system_insights_systems(), self.env['NAME'])
                 self.output("=============== END SYSTEM QUERY ================")
                 self.output("=================================================")
 
                 # QUERY APPS ON SYSTEMS
                 self.output("============== BEGIN VERSION QUERY ==============")
                 self.query_app_versions()
+                # apply the queued membership changes in one batch per group
+                self.flush_group_membership(self.systemGroupID)
+                self.flush_group_membership(self.systemGroupPostID)
                 self.missingUpdate.clear()
                 self.output("=============== END VERSION QUERY ===============")
                 self.output("=================================================")
 
-            # Set naming conventions for command and package name
-            self.set_global_vars()
-
             self.output("============== BEGIN COMMAND CHECK ==============")
             if self.env["JC_DIST"] == "AWS":
-                # if command does not exist do the following
-                if self.check_command(self.commandName):
+                if newCommand:
+                    print("Command does not exist, creating command: " + self.commandName)
                     # create command for the first time
                     self.set_command(self.commandName)
                     # return id of command
-                    self.get_command_id(self.commandName)
-                    # with returned value of command upload package
-                    ## testing function ##
-                    # self.debug_upload_file(self.env["pkg_path"], "jcautopkg")
-                    ## end testing function ##
-                    ## AWS functions to run with packages ##
-                    self.upload_file(
-                        self.env["pkg_path"], self.env["AWS_BUCKET"])
+                    self.lookup_command(self.commandName)
+                    # join the background upload before wiring its URL
+                    # into the command
+                    uploadFuture.result()
+                    uploadExecutor.shutdown()
                     self.edit_command(
                         self.env["pkg_path"], self.commandUrl, self.commandId)
-                    ## END AWS functions ##
                 else:
-                    # command exists just return id
-                    self.get_command_id(self.commandName)
+                    # command exists and its id is already cached
+                    print("Command: " + self.commandName + " already exists")
             self.output("=============== END COMMAND CHECK ===============")
             self.output("=================================================")
 
-            if self.env["JC_TYPE"] != "manual":
+            if deployType != "manual":
                 self.output("========== BEGIN COMMAND ASSOCIATIONS ===========")
                 # Associate command with system group
-                if not self.associate_command_with_group_list(self.get_command_id(self.commandName), self.systemGroupID):
-                    self.associate_command_with_group_post(
-                        self.get_command_id(self.commandName), self.systemGroupID)
-                else:
-                    self.output("Command Already associated with the group")
+                commandID = self.lookup_command(self.commandName)
+                self.associate_commands_with_group(
+                    [commandID], self.systemGroupID)
 
                 self.output("=========== END COMMAND ASSOCIATIONS ============")
                 self.output("=================================================")
 
+            # flush any buffered log output before the results summary
+            for handler in log.handlers:
+                handler.flush()
+
             # Print system associations to the group at the end of the run
             self.result()
             print("========= End JumpCloud AutoPkg Importer ========")